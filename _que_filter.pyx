@@ -0,0 +1,36 @@
+# cython: language_level=3
+"""Compiled job filter loop for que.py
+
+Build in place next to que.py with:
+    cythonize -i _que_filter.pyx
+"""
+
+from cpython.unicode cimport PyUnicode_Find
+
+
+cdef inline bint contains(str haystack, str needle):
+    return PyUnicode_Find(haystack, needle, 0, len(haystack), 1) != -1
+
+
+cpdef tuple filter_jobs(dict jobs, str user, str queue, str state, str name):
+    """Return the (jobids, jobs) lists of jobs matching every filter"""
+    cdef list jobids = []
+    cdef list matched = []
+    cdef str upper_state = state.upper()
+    cdef str job_name
+    cdef dict job
+    for jobid, job in jobs.items():
+        value = job["Job_Name"]
+        if type(value) is int:
+            job["Job_Name"] = str(value)
+        elif type(value) is float:
+            job["Job_Name"] = "FailedToReadName"
+        job_name = job["Job_Name"]
+        # Same order as select_jobs in que.py: user, name, queue, state
+        if ((not user or contains(job["Job_Owner"], user)) and
+                (not name or contains(job_name, name)) and
+                (not queue or contains(job["queue"], queue)) and
+                (not upper_state or contains(job["job_state"], upper_state))):
+            jobids.append(jobid)
+            matched.append(job)
+    return jobids, matched
@@ -1,12 +1,41 @@
 #!/usr/bin/env python3
 
-from collections import OrderedDict
+from collections import Counter
 from datetime import datetime
 import subprocess as sp
 import argparse
+import tempfile
+import ctypes
 import json
+import time
 import sys
+import os
 import re
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    from _que_filter import filter_jobs
+except ImportError:
+    filter_jobs = None
+
+# Above this many queued jobs the compiled _que_filter loop is used, if built
+COMPILED_FILTER_MIN_JOBS = 1000
+# kb per Resource_List mem unit; byte amounts ("...0b") report as 0%
+MEM_UNITS_KB = {"gb": 1024 * 1024, "mb": 1024, "kb": 1, "0b": 0}
+# Values qstat -Fjson prints that are not valid JSON, rewritten by clean_qstat
+NUMERIC_JOB_NAME = re.compile(rb'"Job_Name":\d+,')
+PBS_O_PATH = re.compile(rb'"PBS_O_PATH":\S+,')
+# One pass for all scheduler float attributes qstat prints unquoted
+UNQUOTED_FLOATS = re.compile(
+        rb'"(expl|rho_low|rho_high)":[+\-]?(?:0|[1-9]\d*)(?:\.\d*)?(?:[eE][+\-]?\d+)')
+# Seconds a cached qstat snapshot is reused; override with QUE_CACHE_TTL
+DEFAULT_CACHE_TTL = 5
+# Alternating bold/normal colors for table rows
+ROW_BANDS = ("\033[1;37;48m", "\033[0;37;48m")
+# Table rows formatted between writes to stdout
+WRITE_BATCH_ROWS = 256
 
 def parse_arguments():
     """Parse arguments passed to script"""
@@ -30,22 +59,236 @@ def parse_arguments():
             default="f",
             help="view summary of submitted jobs [t,f]. default: f",
             action="store")
+    parser.add_argument("--no-prefilter", dest="prefilter", required=False,
+            help="parse every job instead of byte-scanning for filters first",
+            action="store_false")
+    parser.add_argument("--no-cache", dest="cache", required=False,
+            help="always query qstat instead of reusing a snapshot taken "
+                 "in the last QUE_CACHE_TTL seconds (default: {0})".format(
+                     DEFAULT_CACHE_TTL),
+            action="store_false")
     return parser
 
 
-def get_qstat_json():
-    """Call qstat for JSON data"""
-    qstat_output = sp.check_output(['qstat','-f','-Fjson'])
-    clean_qstat_output = qstat_output.replace(
-            b'"Job_Name":inf,',b'"Job_Name":"Unknown",') #.replace(b'\\', b'\\\\')
-    clean_qstat_output = re.sub(b'"Job_Name":\d+,', b'"Job_Name":"Unknown",', clean_qstat_output)
-    clean_qstat_output = re.sub(b'"PBS_O_PATH":\S+,', b'', clean_qstat_output)
-    for i in [b'expl', b'rho_low', b'rho_high']:
-        clean_qstat_output = re.sub(b'"' + i + b'":[+\-]?(?:0|[1-9]\d*)(?:\.\d*)?(?:[eE][+\-]?\d+)', 
-                b'"' + i + b'":"float"', clean_qstat_output)
+class Attrl(ctypes.Structure):
+    """PBS IFL attribute list entry (struct attrl)"""
+    pass
+
+Attrl._fields_ = [("next", ctypes.POINTER(Attrl)),
+                  ("name", ctypes.c_char_p),
+                  ("resource", ctypes.c_char_p),
+                  ("value", ctypes.c_char_p),
+                  ("op", ctypes.c_int)]
+
+
+class BatchStatus(ctypes.Structure):
+    """PBS IFL status reply entry (struct batch_status)"""
+    pass
+
+BatchStatus._fields_ = [("next", ctypes.POINTER(BatchStatus)),
+                        ("name", ctypes.c_char_p),
+                        ("attribs", ctypes.POINTER(Attrl)),
+                        ("text", ctypes.c_char_p)]
+
+
+def load_libpbs():
+    """Load libpbs and declare the IFL calls used, or None if unavailable"""
+    try:
+        libpbs = ctypes.CDLL("libpbs.so")
+    except OSError:
+        return None
+    libpbs.pbs_connect.argtypes = [ctypes.c_char_p]
+    libpbs.pbs_connect.restype = ctypes.c_int
+    libpbs.pbs_disconnect.argtypes = [ctypes.c_int]
+    libpbs.pbs_disconnect.restype = ctypes.c_int
+    libpbs.pbs_statjob.argtypes = [ctypes.c_int, ctypes.c_char_p,
+            ctypes.POINTER(Attrl), ctypes.c_char_p]
+    libpbs.pbs_statjob.restype = ctypes.POINTER(BatchStatus)
+    libpbs.pbs_statfree.argtypes = [ctypes.POINTER(BatchStatus)]
+    libpbs.pbs_statfree.restype = None
+    libpbs.pbs_geterrmsg.argtypes = [ctypes.c_int]
+    libpbs.pbs_geterrmsg.restype = ctypes.c_char_p
+    return libpbs
+
+
+def ifl_value(value):
+    """Type IFL attribute strings the way qstat -Fjson does for integers"""
+    value = value.decode("utf-8", "ignore")
+    if value.isdecimal():
+        return int(value)
+    return value
+
+
+def get_qstat_ifl():
+    """Query job status directly through the PBS IFL, or None on failure"""
+    libpbs = load_libpbs()
+    if libpbs is None:
+        return None
+    connection = libpbs.pbs_connect(None)
+    if connection < 0:
+        return None
+    status = None
     try:
-        results = json.loads(clean_qstat_output.decode("utf-8","ignore").replace('^"^^',''),
-                      object_pairs_hook=OrderedDict)
+        status = libpbs.pbs_statjob(connection, None, None, None)
+        # NULL means either an empty queue or an error; only the latter
+        # leaves an error message on the connection
+        if not status and libpbs.pbs_geterrmsg(connection):
+            return None
+        jobs = {}
+        node = status
+        while node:
+            job = {}
+            attrib = node.contents.attribs
+            while attrib:
+                entry = attrib.contents
+                name = entry.name.decode("utf-8", "ignore")
+                value = ifl_value(entry.value or b"")
+                if entry.resource:
+                    job.setdefault(name, {})[
+                            entry.resource.decode("utf-8", "ignore")] = value
+                else:
+                    job[name] = value
+                attrib = entry.next
+            jobs[node.contents.name.decode("utf-8", "ignore")] = job
+            node = node.contents.next
+    finally:
+        if status:
+            libpbs.pbs_statfree(status)
+        libpbs.pbs_disconnect(connection)
+    return {"Jobs": jobs}
+
+
+def prefilter_needles(*filters):
+    """Encode filter strings as they appear inside qstat JSON strings"""
+    return [json.dumps(f, ensure_ascii=False)[1:-1].encode("utf-8")
+            for f in filters if f]
+
+
+def prefilter_jobs(qstat_output, needles):
+    """Decode only the job records whose raw bytes contain every needle"""
+    # JSON strings cannot hold raw newlines, so a job id key opening a line
+    # marks the start of a record in qstat's pretty-printed output
+    starts = [key.end() - 1 for key in re.finditer(
+            rb'\n[ \t]*"\d+(?:\[\d*\])?\.[^"\n]*":[ \t]*\{', qstat_output)]
+    if not starts:
+        return None
+    starts.append(len(qstat_output))
+    decoder = json.JSONDecoder()
+    jobs = {}
+    for start, end in zip(starts, starts[1:]):
+        record = qstat_output[start:end]
+        if not all(needle in record for needle in needles):
+            continue
+        key_end = qstat_output.rfind(b'"', 0, start)
+        key_start = qstat_output.rfind(b'"', 0, key_end)
+        jobid = qstat_output[key_start + 1:key_end].decode("utf-8","ignore")
+        try:
+            jobs[jobid] = decoder.raw_decode(
+                    record.decode("utf-8","ignore").replace('^"^^',''))[0]
+        except json.decoder.JSONDecodeError:
+            return None
+    return {"Jobs": jobs}
+
+
+def clean_qstat(qstat_output):
+    """Rewrite values qstat emits that are not valid JSON"""
+    # Rare pattern; skip the replace pass unless it is present
+    if b'"Job_Name":inf,' in qstat_output:
+        qstat_output = qstat_output.replace(
+                b'"Job_Name":inf,',b'"Job_Name":"Unknown",')
+    qstat_output = NUMERIC_JOB_NAME.sub(b'"Job_Name":"Unknown",', qstat_output)
+    qstat_output = PBS_O_PATH.sub(b'', qstat_output)
+    qstat_output = UNQUOTED_FLOATS.sub(rb'"\1":"float"', qstat_output)
+    return qstat_output
+
+
+def loads_qstat(clean_qstat_output):
+    """Decode cleaned qstat output, with orjson when available"""
+    if orjson is not None:
+        try:
+            if b'^"^^' in clean_qstat_output:
+                clean_qstat_output = clean_qstat_output.replace(b'^"^^', b'')
+            return orjson.loads(clean_qstat_output)
+        except orjson.JSONDecodeError:
+            # Invalid UTF-8 or non-standard literals; retry leniently below
+            pass
+    return json.loads(clean_qstat_output.decode("utf-8","ignore").replace('^"^^',''))
+
+
+def qstat_cache_path():
+    """Per-user file holding the latest raw qstat output"""
+    return os.path.join(tempfile.gettempdir(),
+                        "que-cache-{0}.json".format(os.getuid()))
+
+
+def read_qstat_cache(ttl):
+    """Return cached qstat output if it is younger than ttl seconds"""
+    try:
+        with open(qstat_cache_path(), 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if (stat.st_uid != os.getuid() or
+                    time.time() - stat.st_mtime > ttl):
+                return None
+            return f.read()
+    except OSError:
+        return None
+
+
+def open_qstat_cache():
+    """Open a private temporary file to be moved over the qstat cache"""
+    try:
+        return tempfile.NamedTemporaryFile(prefix="que-cache-", delete=False)
+    except OSError:
+        return None
+
+
+def close_qstat_cache(cache_file, keep):
+    """Close a cache file, atomically moving it into place if keep"""
+    cache_file.close()
+    if keep:
+        try:
+            os.replace(cache_file.name, qstat_cache_path())
+            return
+        except OSError:
+            pass
+    try:
+        os.remove(cache_file.name)
+    except OSError:
+        pass
+
+
+def write_qstat_cache(qstat_output):
+    """Save raw qstat output for repeat invocations"""
+    cache_file = open_qstat_cache()
+    if cache_file is None:
+        return
+    try:
+        cache_file.write(qstat_output)
+    except OSError:
+        close_qstat_cache(cache_file, False)
+        return
+    close_qstat_cache(cache_file, True)
+
+
+def get_qstat_json(needles=(), cache_ttl=0):
+    """Get job data from the PBS IFL, falling back to qstat JSON output"""
+    results = get_qstat_ifl()
+    if results is not None:
+        return results
+    qstat_output = None
+    if cache_ttl > 0:
+        qstat_output = read_qstat_cache(cache_ttl)
+    if qstat_output is None:
+        qstat_output = sp.check_output(['qstat','-f','-Fjson'])
+        if cache_ttl > 0:
+            write_qstat_cache(qstat_output)
+    clean_qstat_output = clean_qstat(qstat_output)
+    if needles:
+        results = prefilter_jobs(clean_qstat_output, needles)
+        if results is not None:
+            return results
+    try:
+        results = loads_qstat(clean_qstat_output)
     except json.decoder.JSONDecodeError as err:
         sys.stderr.write("{0}\n".format(err))
         sys.stderr.write("Error reading queue. See que.error.log\n")
@@ -56,22 +299,17 @@ def get_qstat_json():
     return results
    
 
-def summarize_json(filtered_json):
+def summarize_json(job_rows):
     """Summarize running jobs"""
     # Get total number on queue
-    number_jobs = len(filtered_json)
+    number_jobs = len(job_rows)
     # Get number per queue and R/Q/Other
-    queue_job_counts = {}
-    job_state_counts = {'R':0,'Q':0,'Other':0}
-    for key, value in json_data.items():
-        try:
-            queue_job_counts[value['queue']] = queue_job_counts[value['queue']] + 1
-        except KeyError:
-            queue_job_counts[value['queue']] = 1
-        try:
-            job_state_counts[value['job_state'].rstrip()] = job_state_counts[value['job_state']] + 1
-        except KeyError:
-            job_state_counts['Other'] = job_state_counts['Other'] + 1
+    queue_job_counts = Counter()
+    job_state_counts = Counter({'R':0,'Q':0,'Other':0})
+    for row in job_rows:
+        queue_job_counts[row.queue] += 1
+        state = row.state.rstrip()
+        job_state_counts[state if state in ('R', 'Q') else 'Other'] += 1
     summary = {"NumberOfJobs": number_jobs,
                "JobsPerQueue": list(queue_job_counts.items()),
                "JobStates": list(job_state_counts.items())}
@@ -79,10 +317,7 @@ def summarize_json(filtered_json):
 
 
 def convert_walltime(used_walltime, total_walltime):
-    try:
-        used_walltime = used_walltime['resources_used']["walltime"]
-    except KeyError:
-        used_walltime = "00:00:00"
+    used_walltime = used_walltime.get('resources_used', {}).get("walltime", "00:00:00")
     total_walltime = total_walltime["walltime"]
     used_walltime = used_walltime.split(':')[0:2]
     total_walltime = total_walltime.split(':')[0:2]
@@ -96,29 +331,24 @@ def convert_walltime(used_walltime, total_walltime):
 
 
 def convert_cpu_efficiency(used_cpus, total_cpus):
-    try:
-        used_cpus = used_cpus['resources_used']["cpupercent"]
-    except KeyError:
-        used_cpus = 0
+    used_cpus = used_cpus.get('resources_used', {}).get("cpupercent", 0)
     total_cpus = total_cpus["ncpus"]
     return f"{(used_cpus / (total_cpus*100))*100:3.0f}%"
 
 
+def total_mem_kb(total_mem):
+    """Convert a Resource_List mem string to kb, or None for byte units"""
+    multiplier = MEM_UNITS_KB.get(total_mem[-2:].lower(), 1)
+    if multiplier == 0:
+        return None
+    return float(total_mem[:-2]) * multiplier
+
+
 def convert_mem_efficiency(used_mem, total_mem):
-    try:
-        used_mem = int(used_mem['resources_used']["mem"].replace("kb","").replace("b",""))
-    except KeyError:
-        used_mem = 0
-    total_mem = total_mem["mem"]
-    units = total_mem[len(total_mem)-2:]
-    total_mem = float(total_mem[0:len(total_mem)-2])
-    if units.lower() == "gb":
-        total_mem = total_mem * 1024 * 1024
-    elif units.lower() == "mb":
-        total_mem = total_mem * 1024
-    elif units.lower() == "kb":
-        total_mem = total_mem
-    elif units.lower() == "0b":
+    used_mem = used_mem.get('resources_used', {}).get("mem", "0kb")
+    used_mem = int(used_mem.replace("kb","").replace("b",""))
+    total_mem = total_mem_kb(total_mem["mem"])
+    if total_mem is None:
         return f"0%"
     return f"{(used_mem / total_mem)*100:3.0f}%"
 
@@ -130,92 +360,140 @@ def fill_none(variable):
         return variable
 
 
-def filter_json(json_data, user, queue, state, name):
-    """Given arguments, filter JSON jobs"""
-    filtered_json = OrderedDict()
-    # [user, queue, state, name, mem, ncpus, jobid]
-    spacing = {"user": max(7, len(user)), 
-            "queue":max(7, len(queue)),
-            "state":5,
-            "name":7,
-            "mem":3,
-            "ncpus":4,
-            "jobid":8,
-            "walltime":8,
-            "cpu_efficiency":len("CPU Eff."),
-            "mem_efficiency":len("MEM Eff.")}
-    for jobid, job in json_data["Jobs"].items():
-        if type(job["Job_Name"]) == int:
-            job["Job_Name"] = str(job["Job_Name"])
-        elif type(job["Job_Name"]) == float:
-            job["Job_Name"] = "FailedToReadName"
+class JobRow:
+    """Fields of one filtered job shown in the table and summary"""
+    __slots__ = ("jobid", "name", "mem", "ncpus", "user", "queue", "state",
+                 "walltime", "cpu_pct", "mem_pct")
+
+    def __init__(self, jobid, job, resource_list, walltime, cpu_pct, mem_pct):
+        self.jobid = jobid
+        self.name = job["Job_Name"]
+        self.mem = resource_list["mem"]
+        self.ncpus = resource_list["ncpus"]
+        self.user = job["Job_Owner"].partition('@')[0]
+        self.queue = job["queue"]
+        self.state = job["job_state"]
+        self.walltime = walltime
+        self.cpu_pct = cpu_pct
+        self.mem_pct = mem_pct
+
+
+def column_width(minimum, values):
+    """Widest of minimum and the lengths of values"""
+    return max(minimum, max(map(len, values), default=0))
+
+
+def select_jobs(all_jobs, user, queue, state, name):
+    """Return the (jobids, jobs) lists of jobs matching every filter"""
+    state_u = state.upper()
+    jobids = []
+    jobs = []
+    for jobid, job in all_jobs.items():
+        job_name = job["Job_Name"]
+        if type(job_name) == int:
+            job_name = job["Job_Name"] = str(job_name)
+        elif type(job_name) == float:
+            job_name = job["Job_Name"] = "FailedToReadName"
         try:
-            if ((user in job["Job_Owner"]) and 
-                    (queue in job["queue"]) and 
-                    (state.upper() in job["job_state"]) and
-                    (name in job["Job_Name"])):
-                filtered_json[jobid] = job
-                spacing["name"] = max(spacing["name"], len(job["Job_Name"]))
-                spacing["mem"] = max(spacing["mem"], len(job["Resource_List"]["mem"]))
-                spacing["queue"] = max(spacing["queue"], len(job["queue"]))
-                spacing["walltime"] = max(spacing["walltime"], 
-                                          len(convert_walltime(job,  
-                                                               job["Resource_List"]
-                                                               )
-                                             )
-                                          )
-                spacing["ncpus"] = max(spacing["ncpus"], 
-                        len(str(job["Resource_List"]["ncpus"])))
-                spacing["cpu_efficiency"] = max(spacing["cpu_efficiency"],
-                        len(convert_cpu_efficiency(job, 
-                            job["Resource_List"])))
-                spacing["mem_efficiency"] = max(spacing["mem_efficiency"],
-                        len(convert_mem_efficiency(job,
-                            job["Resource_List"])))
+            # Users and job names narrow the queue far more than queue or
+            # state substrings, so rejected jobs usually fail the first check
+            if (user in job["Job_Owner"] and name in job_name and
+                    queue in job["queue"] and state_u in job["job_state"]):
+                jobids.append(jobid)
+                jobs.append(job)
         except TypeError:
             print("TypeError")
             print(job)
             sys.exit(1)
-    return filtered_json, spacing
+    return jobids, jobs
 
 
-def generate_table(json_data, spacing):
-    """Take filtered JSON and put into readable table"""
+def filter_json(json_data, user, queue, state, name):
+    """Given arguments, filter JSON jobs into table rows"""
+    all_jobs = json_data["Jobs"]
+    selected = None
+    if filter_jobs is not None and len(all_jobs) > COMPILED_FILTER_MIN_JOBS:
+        try:
+            selected = filter_jobs(all_jobs, user, queue, state, name)
+        except TypeError:
+            # Malformed job; the Python loop reports it
+            pass
+    if selected is None:
+        selected = select_jobs(all_jobs, user, queue, state, name)
+    jobids, jobs = selected
+    rows = []
+    for jobid, job in zip(jobids, jobs):
+        resource_list = job["Resource_List"]
+        rows.append(JobRow(jobid, job, resource_list,
+                           convert_walltime(job, resource_list),
+                           convert_cpu_efficiency(job, resource_list),
+                           convert_mem_efficiency(job, resource_list)))
+    # [user, queue, state, name, mem, ncpus, jobid]
+    spacing = {"user": max(7, len(user)), 
+            "queue": column_width(max(7, len(queue)),
+                                  (row.queue for row in rows)),
+            "state":5,
+            "name": column_width(7, (row.name for row in rows)),
+            "mem": column_width(3, (row.mem for row in rows)),
+            "ncpus": column_width(4, (str(row.ncpus) for row in rows)),
+            "jobid":8,
+            "walltime": column_width(8, (row.walltime for row in rows)),
+            "cpu_efficiency": column_width(len("CPU Eff."),
+                                           (row.cpu_pct for row in rows)),
+            "mem_efficiency": column_width(len("MEM Eff."),
+                                           (row.mem_pct for row in rows))}
+    return rows, spacing
+
+
+def generate_table(job_rows, spacing):
+    """Take filtered job rows and yield them as readable table lines"""
     for key, value in spacing.items():
         spacing[key] = value + 1
-    csv_table = (f"\033[1;32;40m{'JobID':^{spacing['jobid']}}" +
-                 f"{'JobName':^{spacing['name']}}" +
-                 f"{'Mem':^{spacing['mem']}}" + 
-                 f"{'CPUs':^{spacing['ncpus']}}" + 
-                 f"{'User':^{spacing['user']}}" + 
-                 f"{'Queue':^{spacing['queue']}}" + 
-                 f"{'State':^{spacing['state']}}" + 
-                 f"{'Walltime':^{spacing['walltime']}}" +
-                 f"{'%CPU':^{spacing['cpu_efficiency']}}" + 
-                 f"{'%MEM':^{spacing['mem_efficiency']}}\033[00m\n")
+    columns = ["jobid", "name", "mem", "ncpus", "user", "queue", "state",
+               "walltime", "cpu_efficiency", "mem_efficiency"]
+    # One template with every column width baked in, reused for each row
+    row_format = "".join(f"{{:^{spacing[column]}}}" for column in columns)
+    header = ("\033[1;32;40m" + 
+              row_format.format("JobID", "JobName", "Mem", "CPUs", "User",
+                                "Queue", "State", "Walltime", "%CPU", "%MEM") +
+              "\033[00m\n")
+    row_format = row_format + "\033[00m\n"
+    yield header
     even = 0
-    for key, value in json_data.items():
-        walltime = convert_walltime(value, 
-                                    value['Resource_List'])
-        cpu_efficiency = convert_cpu_efficiency(value, 
-                                                value["Resource_List"])
-        mem_efficiency = convert_mem_efficiency(value, value["Resource_List"])
-        job = (f"{key.replace('.pbs02',''):^{spacing['jobid']}}" + 
-               f"{value['Job_Name']:^{spacing['name']}}" +
-               f"{value['Resource_List']['mem']:^{spacing['mem']}}" +
-               f"{value['Resource_List']['ncpus']:^{spacing['ncpus']}}" +
-               f"{value['Job_Owner'].split('@')[0]:^{spacing['user']}}" +
-               f"{value['queue']:^{spacing['queue']}}" +
-               f"{value['job_state']:^{spacing['state']}}" + 
-               f"{walltime:^{spacing['walltime']}}" + 
-               f"{cpu_efficiency:^{spacing['cpu_efficiency']}}" + 
-               f"{mem_efficiency:^{spacing['mem_efficiency']}}\033[00m\n")
-        if even % 2 == 0:
-            csv_table = csv_table + "\033[1;37;48m" + job
-        else:
-            csv_table = csv_table + "\033[0;37;48m" + job
+    format_row = row_format.format
+    for row in job_rows:
+        job = format_row(row.jobid.removesuffix('.pbs02'),
+                         row.name,
+                         row.mem,
+                         row.ncpus,
+                         row.user,
+                         row.queue,
+                         row.state,
+                         row.walltime,
+                         row.cpu_pct,
+                         row.mem_pct)
+        yield ROW_BANDS[even & 1] + job
         even += 1
-    return csv_table
+
+
+def write_table(table_rows, batch_size=WRITE_BATCH_ROWS):
+    """Write table rows to stdout in batches as they are formatted"""
+    # Let print() output pass straight through so it stays in order
+    sys.stdout.reconfigure(write_through=True)
+    out = sys.stdout.buffer
+    write = out.write
+    encoding = sys.stdout.encoding
+    errors = sys.stdout.errors
+    batch = []
+    for row in table_rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            write("".join(batch).encode(encoding, errors))
+            out.flush()
+            batch.clear()
+    batch.append("\n")
+    write("".join(batch).encode(encoding, errors))
+    out.flush()
 
 
 def tuples_to_string(job_list):
@@ -241,15 +519,24 @@ if __name__ == "__main__":
     args = parser.parse_args()
     if not (args.user or args.queue):
         parser.error("que -h")
-    json_data = get_qstat_json()
-    json_data, spacing = filter_json(json_data, 
-            fill_none(args.user), 
-            fill_none(args.queue), 
-            fill_none(args.state),
-            fill_none(args.name))
-    json_summary = summarize_json(json_data)
+    needles = []
+    if args.prefilter:
+        needles = prefilter_needles(args.user, args.queue, args.name)
+    filters = (fill_none(args.user),
+               fill_none(args.queue),
+               fill_none(args.state),
+               fill_none(args.name))
+    cache_ttl = 0
+    if args.cache:
+        try:
+            cache_ttl = float(os.environ.get("QUE_CACHE_TTL",
+                                             DEFAULT_CACHE_TTL))
+        except ValueError:
+            parser.error("QUE_CACHE_TTL must be a number of seconds")
+    json_data = get_qstat_json(needles, cache_ttl)
+    job_rows, spacing = filter_json(json_data, *filters)
+    json_summary = summarize_json(job_rows)
     if args.brief.lower() == "f":
         #print("\033[1;31;48m{0}  {1}\033[00m".format(datetime.now(), json_summary))
-        data_table = generate_table(json_data, spacing)
-        print(data_table)
+        write_table(generate_table(job_rows, spacing))
     pretty_print_summary(json_summary)